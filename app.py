@@ -1,33 +1,70 @@
-import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from importlib import import_module
+from werkzeug.exceptions import HTTPException
 
 from config import Config
 from helper import (
     install_package,
+    load_function_links,
+    load_functions,
+    load_functions_index,
+    remove_function,
     save_route_code,
     get_existing_code,
+    route_file_paths,
     sanitize_route_name,
     trigger_reload,
 )
 
+try:  # optional: faster jsonify, same output shape
+    import orjson
+except ImportError:  # pragma: no cover - Flask's default provider is used
+    orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def load_functions():
-    """Read the registered utilities from functions.json (empty list on error)."""
-    try:
-        with open(Config.FUNCTIONS_JSON, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError:
-        logger.error("functions.json is not valid JSON.")
-        return []
+class OrjsonProvider(DefaultJSONProvider):
+    """Serve ``jsonify`` responses through orjson.
+
+    Keys stay sorted and dates, decimals and ``__html__`` objects still go
+    through Flask's ``default`` hook, so responses look the same as with the
+    stock provider, only cheaper to build. Calls with extra ``json.dumps``
+    arguments (e.g. from the ``tojson`` filter) keep the stdlib path.
+    """
+
+    def _options(self):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        compact = self.compact
+        if compact is None:
+            compact = not self._app.debug
+        return option if compact else option | orjson.OPT_INDENT_2
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options())
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def _import_route_module(function):
+    python_file = function["python_file"].replace(".py", "")
+    return import_module(f"routes.{python_file}")
 
 
 def register_blueprints_from_json(app):
@@ -36,12 +73,19 @@ def register_blueprints_from_json(app):
     Returns a list of human-readable error strings for any that failed to load,
     so the home page can surface them instead of crashing the whole app.
     """
+    functions = load_functions()
+    # Import the route modules on a thread pool so their file I/O overlaps; the
+    # parent package is imported first so the workers don't race on it.
+    # Registration stays serial because Flask's setup methods aren't thread-safe.
+    import_module("routes")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(_import_route_module, function) for function in functions]
+
     errors = []
-    for function in load_functions():
+    for function, future in zip(functions, futures):
         blueprint_name = function.get("bluePrint", "<unknown>")
         try:
-            python_file = function["python_file"].replace(".py", "")
-            module = import_module(f"routes.{python_file}")
+            module = future.result()
             blueprint = getattr(module, blueprint_name)
             app.register_blueprint(blueprint)
             logger.info("Registered blueprint '%s'.", blueprint_name)
@@ -54,19 +98,39 @@ def register_blueprints_from_json(app):
 
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
+    # from_object already sets SECRET_KEY; the random dev fallback is generated
+    # once in config.py. Production must pin it so sessions outlive restarts and
+    # are shared by every worker.
     app.config.from_object(Config)
-    app.secret_key = Config.SECRET_KEY
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    if Config.PRODUCTION and not os.environ.get("FLASK_SECRET_KEY"):
+        raise RuntimeError(
+            "FLASK_SECRET_KEY must be set when FLASK_PRODUCTION=1 "
+            "(e.g. python -c 'import secrets; print(secrets.token_hex(32))')."
+        )
+
+    if Config.PROFILE:
+        from werkzeug.middleware.profiler import ProfilerMiddleware
+
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        app.wsgi_app = ProfilerMiddleware(
+            app.wsgi_app, restrictions=[30], profile_dir=Config.PROFILE_DIR
+        )
 
     blueprint_errors = register_blueprints_from_json(app)
+    # Outside debug templates never change, so resolve the compiled one once.
+    home_template = "home.html" if app.jinja_env.auto_reload else app.jinja_env.get_template("home.html")
 
     @app.route("/")
     def home():
-        links = [{"href": f["href"], "title": f["href"]} for f in load_functions()]
-        return render_template("home.html", links=links, errors=blueprint_errors)
+        return render_template(home_template, links=load_function_links(), errors=blueprint_errors)
 
     @app.route("/routes/<path:filename>")
     def serve_routes(filename):
-        return send_from_directory("routes", filename)
+        return send_from_directory(
+            Config.ROUTES_DIR, filename, max_age=Config.ROUTES_MAX_AGE, conditional=True
+        )
 
     @app.route("/submit", methods=["POST"])
     def submit():
@@ -89,8 +153,7 @@ def create_app():
                 f"is {get_existing_code(route_name)} based on this prompt: {prompt}"
             )
         else:
-            existing = {sanitize_route_name(f["href"]) for f in load_functions()}
-            if route_name in existing:
+            if f"/{route_name}_html" in load_functions_index():
                 return jsonify({"error": "A utility with that title already exists."}), 400
             user_prompt = f"Create a utility with route_name: {route_name}, prompt: {prompt}"
 
@@ -100,7 +163,8 @@ def create_app():
             logger.error("Generation failed: %s", e)
             return jsonify({"error": f"Generation failed: {e}"}), 500
 
-        trigger_reload()
+        if not trigger_reload():
+            return jsonify({"message": "Utility saved. Restart the server to load it.", "href": href}), 200
         return jsonify({"message": "Utility ready.", "href": href}), 200
 
     @app.route("/chatbot", methods=["POST"])
@@ -127,7 +191,8 @@ def create_app():
             logger.error("Chatbot update failed: %s", e)
             return jsonify({"error": str(e)}), 500
 
-        trigger_reload()
+        if not trigger_reload():
+            return jsonify({"message": "Page saved. Restart the server to load it."}), 200
         return jsonify({"message": "Page updated."}), 200
 
     @app.route("/get_code", methods=["GET"])
@@ -165,24 +230,16 @@ def create_app():
         except ValueError as e:
             return jsonify({"message": str(e)}), 400
 
-        href = f"/{route_name}_html"
-        functions = load_functions()
-        updated = [f for f in functions if f["href"] != href]
-        if len(updated) == len(functions):
+        if not remove_function(f"/{route_name}_html"):
             return jsonify({"message": "Entry not found."}), 404
 
-        with open(Config.FUNCTIONS_JSON, "w") as f:
-            json.dump(updated, f, indent=4)
-
-        for path in (
-            os.path.join(Config.ROUTES_DIR, f"{route_name}_python.py"),
-            os.path.join(Config.TEMPLATES_DIR, f"{route_name}_html.html"),
-        ):
+        for path in route_file_paths(route_name):
             if os.path.exists(path):
                 os.remove(path)
                 logger.info("Deleted file: %s", path)
 
-        trigger_reload()
+        if not trigger_reload():
+            return jsonify({"message": "Tool deleted. Restart the server to unload it."}), 200
         return jsonify({"message": "Tool deleted successfully."}), 200
 
     @app.errorhandler(404)
@@ -191,7 +248,11 @@ def create_app():
 
     @app.errorhandler(Exception)
     def handle_exception(e):
-        logger.error("Unhandled exception: %s", e)
+        # HTTP errors (405, 413, ...) also reach this handler; keep their own status
+        # instead of turning them into a 500.
+        if isinstance(e, HTTPException):
+            return e
+        logger.exception("Unhandled exception: %s", e)
         # Only reveal the raw error in debug; otherwise show a generic message.
         message = str(e) if app.debug else "An internal error occurred."
         return render_template("errors.html", message=message), 500
@@ -203,12 +264,24 @@ app = create_app()
 
 
 if __name__ == "__main__":
-    # The reload-trigger file is watched so generating/deleting a utility reloads the
-    # server without ever modifying source files.
-    open(Config.RELOAD_TRIGGER, "a").close()
-    app.run(
-        debug=Config.DEBUG,
-        host=Config.HOST,
-        port=Config.PORT,
-        extra_files=[Config.RELOAD_TRIGGER],
-    )
+    if Config.PRODUCTION:
+        # Threaded production server. Multi-process works too, e.g.
+        # `gunicorn -w 4 -k gthread --threads 8 app:app` (set FLASK_SECRET_KEY).
+        try:
+            from waitress import serve
+        except ImportError:
+            raise SystemExit(
+                "FLASK_PRODUCTION=1 needs waitress: pip install -r requirements.txt"
+            ) from None
+
+        serve(app, host=Config.HOST, port=Config.PORT, threads=Config.WSGI_THREADS)
+    else:
+        # The reload-trigger file is watched so generating/deleting a utility reloads
+        # the server without ever modifying source files.
+        open(Config.RELOAD_TRIGGER, "a").close()
+        app.run(
+            debug=Config.DEBUG,
+            host=Config.HOST,
+            port=Config.PORT,
+            extra_files=[Config.RELOAD_TRIGGER],
+        )
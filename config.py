@@ -20,19 +20,33 @@ class Config:
     # provided we fall back to a random one (sessions reset on restart, which is fine
     # for a single-user local tool).
     SECRET_KEY = os.environ.get("FLASK_SECRET_KEY") or os.urandom(24)
-    DEBUG = os.environ.get("FLASK_DEBUG", "1") not in ("0", "false", "False", "")
+    # Serve with waitress (multi-threaded, no debugger/reloader) instead of the
+    # Werkzeug dev server. Without the reloader, new utilities load on restart.
+    PRODUCTION = os.environ.get("FLASK_PRODUCTION", "0") not in ("0", "false", "False", "")
+    WSGI_THREADS = int(os.environ.get("WSGI_THREADS", "16"))
+    # Debug (tracebacks to clients, template auto-reload) is never on in production,
+    # whatever FLASK_DEBUG says.
+    DEBUG = not PRODUCTION and os.environ.get("FLASK_DEBUG", "1") not in ("0", "false", "False", "")
 
     # Bind to localhost only: this tool generates and executes code and can pip-install
     # packages, so it must never be exposed on a network interface by default.
     HOST = os.environ.get("FLASK_HOST", "127.0.0.1")
     PORT = int(os.environ.get("FLASK_PORT", "5001"))
 
+    # Wrap the app in Werkzeug's ProfilerMiddleware: prints the top 30 functions per
+    # request and dumps a .prof file per request into PROFILE_DIR.
+    PROFILE = os.environ.get("FLASK_PROFILE", "0") not in ("0", "false", "False", "")
+
     # --- Paths ---
     ROUTES_DIR = os.path.join(BASE_DIR, "routes")
     TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
     FUNCTIONS_JSON = os.path.join(BASE_DIR, "functions.json")
     # Touched to trigger the Werkzeug reloader without mutating source files.
     RELOAD_TRIGGER = os.path.join(BASE_DIR, ".reload_trigger")
+    PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+    # Browser cache lifetime for /routes/<file>. Kept short because the chatbot
+    # rewrites these files; after it expires the ETag still yields cheap 304s.
+    ROUTES_MAX_AGE = int(os.environ.get("ROUTES_MAX_AGE", "300"))
 
     # --- OpenAI ---
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
@@ -1,50 +1,82 @@
 import json
+import logging
 import os
 import re
 import sys
-import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-from openai import OpenAI
+# ``openai`` (httpx, pydantic, anyio, ...) and ``subprocess`` are imported inside the
+# functions that use them so they stay off the app's cold-start import path.
 
-try:  # OpenAI SDK v1 exception types (present in normal installs)
-    from openai import (
-        AuthenticationError,
-        RateLimitError,
-        APIConnectionError,
-        APITimeoutError,
-        PermissionDeniedError,
-        NotFoundError,
-        APIStatusError,
-    )
-except Exception:  # pragma: no cover - defensive for unusual SDK versions
-    class _MissingOpenAIError(Exception):
-        pass
-    AuthenticationError = RateLimitError = APIConnectionError = APITimeoutError = \
-        PermissionDeniedError = NotFoundError = APIStatusError = _MissingOpenAIError
+try:  # orjson parses/serializes several times faster than the stdlib json module
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback keeps it optional
+    orjson = None
 
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 routes_dir = Config.ROUTES_DIR
 templates_dir = Config.TEMPLATES_DIR
 
 # Route names become file paths, so we only ever allow a safe identifier-like
 # character set. This is the single chokepoint guarding against path traversal.
 ROUTE_NAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
+# The Jinja scaffolding save_route_code wraps around every generated template body.
+JINJA_SCAFFOLD_RE = re.compile(r'\{%\s*(?:endblock|extends\s+"base\.html"|block\s+content)\s*%\}')
 # pip package specs: name plus optional version constraint / extras.
 PACKAGE_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._\-]*(\[[A-Za-z0-9,._\-]+\])?([=<>!~]=?[A-Za-z0-9.\*]+)?$")
 
 
+def json_loads(data):
+    """Parse JSON from ``str`` or ``bytes``, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj):
+    """Serialize ``obj`` to indented UTF-8 JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+_openai_client = None
+
+
 def _client():
     """Build the OpenAI client lazily so a missing key fails loudly at call time
-    with an actionable message rather than at import time."""
+    with an actionable message rather than at import time.
+
+    The client is memoized so later generations reuse its connection pool.
+    """
+    global _openai_client
+    if _openai_client is not None:
+        return _openai_client
     if not Config.OPENAI_API_KEY:
         raise RuntimeError(
             "OPENAI_API_KEY is not set. Copy .env.example to .env and add your key "
             "(get one at https://platform.openai.com/api-keys)."
         )
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    # One explicitly sized, keep-alive pool shared by every request thread, so
+    # concurrent generations reuse warm TLS connections instead of opening new ones.
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    )
     # Fail fast: short timeout and a single retry so a bad key/quota surfaces a
     # clear error in seconds instead of spamming retries and hanging the request.
-    return OpenAI(api_key=Config.OPENAI_API_KEY, timeout=30, max_retries=1)
+    _openai_client = OpenAI(
+        api_key=Config.OPENAI_API_KEY, timeout=30, max_retries=1, http_client=http_client
+    )
+    return _openai_client
 
 
 def sanitize_route_name(name):
@@ -75,6 +107,14 @@ def validate_package_name(package):
     return package
 
 
+def route_file_paths(route_name):
+    """Return ``(python_path, html_path)`` for an already-sanitized route name."""
+    return (
+        os.path.join(routes_dir, f"{route_name}_python.py"),
+        os.path.join(templates_dir, f"{route_name}_html.html"),
+    )
+
+
 def ensure_directories():
     """Ensure required directories exist inside the package."""
     os.makedirs(routes_dir, exist_ok=True)
@@ -87,13 +127,24 @@ def trigger_reload():
     This replaces the old approach of mutating ``app.py`` in place (which could
     corrupt the file). The trigger file is registered via ``extra_files`` in
     ``app.run`` so touching it is enough to reload.
+
+    Blueprints can't be (re)registered in-process instead: Flask rejects setup
+    calls once the app has served a request. The reloader only runs under the
+    dev server with debug on; otherwise (production, or ``FLASK_DEBUG=0``) nothing
+    is watching, so this returns False and the change loads on restart.
     """
+    if Config.PRODUCTION or not Config.DEBUG:
+        logger.info("Utility files changed; restart the server to load them.")
+        return False
     open(Config.RELOAD_TRIGGER, "a").close()
     os.utime(Config.RELOAD_TRIGGER, None)
+    return True
 
 
 def install_package(package):
     """Install a Python package using pip after validating its name."""
+    import subprocess
+
     try:
         package = validate_package_name(package)
     except ValueError as e:
@@ -105,29 +156,23 @@ def install_package(package):
         return f"Error installing package '{package}': {e}"
 
 
-def get_existing_code(route_name):
-    route_name = sanitize_route_name(route_name)
-    python_file_path = os.path.join(routes_dir, f"{route_name}_python.py")
-    html_file_path = os.path.join(templates_dir, f"{route_name}_html.html")
+def _read_text(path):
+    """Return a file's contents, or "" if it doesn't exist (no separate stat)."""
+    try:
+        return Path(path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return ""
 
-    python_code = ""
-    html_code = ""
 
-    if os.path.exists(python_file_path):
-        with open(python_file_path, "r") as file:
-            python_code = file.read()
+def get_existing_code(route_name):
+    route_name = sanitize_route_name(route_name)
+    python_file_path, html_file_path = route_file_paths(route_name)
 
-    if os.path.exists(html_file_path):
-        with open(html_file_path, "r") as file:
-            html_code = file.read()
+    python_code = _read_text(python_file_path)
+    html_code = _read_text(html_file_path)
 
-        # Strip the Jinja scaffolding so the user sees only their template body.
-        for target_string in (
-            '{% endblock %}',
-            '{% extends "base.html" %}',
-            '{% block content %}',
-        ):
-            html_code = html_code.replace(target_string, "")
+    # Strip the Jinja scaffolding so the user sees only their template body.
+    html_code = JINJA_SCAFFOLD_RE.sub("", html_code)
 
     return {
         "python_code": python_code.strip(),
@@ -140,12 +185,98 @@ def write_to_file(file_path, content):
 
     The model already returns a normal (already-unescaped) string via JSON, so we
     write it directly. The previous ``unicode_escape`` round-trip corrupted any code
-    containing backslashes or non-ASCII characters.
+    containing backslashes or non-ASCII characters. UTF-8 is explicit so the
+    result doesn't depend on the host's locale encoding.
     """
-    with open(file_path, "w") as file:
+    with open(file_path, "w", encoding="utf-8") as file:
         file.write(content)
 
 
+# Parsed functions.json, reused until the file's mtime/size changes so the hot
+# routes pay a single stat() instead of a reopen + reparse on every request.
+_functions_cache = {"mtime": 0, "size": 0, "data": None, "by_href": None, "links": None}
+# Serialises every read-modify-write of functions.json (waitress serves requests
+# on many threads, so /submit and /delete can run concurrently).
+_FUNCTIONS_LOCK = threading.RLock()
+
+
+def _refresh_functions_cache(functions, st):
+    _functions_cache["mtime"] = st.st_mtime_ns
+    _functions_cache["size"] = st.st_size
+    _functions_cache["data"] = functions
+    _functions_cache["by_href"] = {f["href"]: f for f in functions}
+    _functions_cache["links"] = [{"href": f["href"], "title": f["href"]} for f in functions]
+
+
+def load_functions():
+    """Read the registered utilities from functions.json (empty list on error).
+
+    The parsed list is cached and only re-read when the file changes on disk, so
+    callers must treat the returned list as read-only.
+    """
+    json_path = Config.FUNCTIONS_JSON
+    try:
+        st = os.stat(json_path)
+    except FileNotFoundError:
+        return []
+    if (
+        _functions_cache["data"] is not None
+        and st.st_mtime_ns == _functions_cache["mtime"]
+        and st.st_size == _functions_cache["size"]
+    ):
+        return _functions_cache["data"]
+    try:
+        with open(json_path, "rb") as f:
+            functions = json_loads(f.read())
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError:
+        logger.error("functions.json is not valid JSON.")
+        return []
+    _refresh_functions_cache(functions, st)
+    return functions
+
+
+def load_functions_index():
+    """Registered utilities keyed by href for O(1) lookups (cached, read-only)."""
+    if not load_functions():
+        return {}
+    return _functions_cache["by_href"]
+
+
+def load_function_links():
+    """Home-page link dicts for the registered utilities (rebuilt with the cache)."""
+    if not load_functions():
+        return []
+    return _functions_cache["links"]
+
+
+def save_functions(functions):
+    """Rewrite functions.json atomically and refresh the in-memory cache.
+
+    The temp file is fsynced before ``os.replace`` swaps it in, so after a crash
+    readers see either the old or the new file, never a half-written one.
+    """
+    json_path = Config.FUNCTIONS_JSON
+    with _FUNCTIONS_LOCK:
+        # A unique temp file per write, so no two writers can share one.
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(json_path), prefix=".functions.", suffix=".tmp"
+        )
+        try:
+            os.fchmod(fd, 0o644)  # mkstemp creates 0600; keep the usual mode
+            with os.fdopen(fd, "wb") as f:
+                f.write(json_dumps(functions))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, json_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _refresh_functions_cache(list(functions), os.stat(json_path))
+
+
 def update_functions_json(route_name):
     """Add a new route entry to functions.json if it isn't already present."""
     new_entry = {
@@ -155,19 +286,20 @@ def update_functions_json(route_name):
         "python_file": f"{route_name}_python.py",
     }
 
-    json_path = Config.FUNCTIONS_JSON
-    if os.path.exists(json_path):
-        with open(json_path, "r") as functions_file:
-            functions = json.load(functions_file)
-    else:
-        functions = []
+    with _FUNCTIONS_LOCK:
+        if new_entry["href"] in load_functions_index():
+            return
+        save_functions([*load_functions(), new_entry])
 
-    if any(fn.get("href") == new_entry["href"] for fn in functions):
-        return
 
-    functions.append(new_entry)
-    with open(json_path, "w") as functions_file:
-        json.dump(functions, functions_file, indent=4)
+def remove_function(href):
+    """Drop the entry for ``href`` from functions.json. Returns False if absent."""
+    with _FUNCTIONS_LOCK:
+        by_href = dict(load_functions_index())
+        if by_href.pop(href, None) is None:
+            return False
+        save_functions(list(by_href.values()))
+        return True
 
 
 SYSTEM_PROMPT = """You are an assistant that generates self-contained Flask utilities.
@@ -192,6 +324,16 @@ SYSTEM_PROMPT = """You are an assistant that generates self-contained Flask util
 
 def _friendly_openai_error(exc):
     """Translate an OpenAI SDK exception into an actionable, user-facing message."""
+    from openai import (
+        AuthenticationError,
+        RateLimitError,
+        APIConnectionError,
+        APITimeoutError,
+        PermissionDeniedError,
+        NotFoundError,
+        APIStatusError,
+    )
+
     model = Config.OPENAI_MODEL
     if isinstance(exc, AuthenticationError):
         return ("OpenAI rejected the API key (401). Check OPENAI_API_KEY in your .env "
@@ -219,9 +361,15 @@ def _friendly_openai_error(exc):
 
 
 def generate_openai_response(prompt):
-    """Generate Python and HTML code using the OpenAI API."""
+    """Generate Python and HTML code using the OpenAI API.
+
+    The completion is streamed: for long generations tokens keep arriving, so the
+    client's read timeout applies between chunks instead of to the whole reply.
+    """
+    from openai import APIError
+
     try:
-        response = _client().chat.completions.create(
+        stream = _client().chat.completions.create(
             model=Config.OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
@@ -241,12 +389,13 @@ def generate_openai_response(prompt):
                     },
                 },
             },
+            stream=True,
         )
-    except (AuthenticationError, RateLimitError, APIConnectionError, APITimeoutError,
-            PermissionDeniedError, NotFoundError, APIStatusError) as exc:
+        parts = [chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices]
+    except APIError as exc:  # base of every SDK v1 auth/rate/connection/status error
         raise RuntimeError(_friendly_openai_error(exc)) from exc
 
-    response_content = response.choices[0].message.content.strip()
+    response_content = "".join(parts).strip()
 
     # Defensively strip code fences if the model wraps the JSON.
     if response_content.startswith("```json") and response_content.endswith("```"):
@@ -254,7 +403,7 @@ def generate_openai_response(prompt):
     elif response_content.startswith("```") and response_content.endswith("```"):
         response_content = response_content[3:-3].strip()
 
-    return json.loads(response_content)
+    return json_loads(response_content)
 
 
 def save_route_code(route_name, prompt):
@@ -269,11 +418,7 @@ def save_route_code(route_name, prompt):
     html_code = generated_content["html_code"]
 
     ensure_directories()
-
-    python_file_path = os.path.join(routes_dir, f"{route_name}_python.py")
-    html_file_path = os.path.join(templates_dir, f"{route_name}_html.html")
-
-    write_to_file(python_file_path, python_code)
+    python_file_path, html_file_path = route_file_paths(route_name)
 
     wrapped_html = (
         '{% extends "base.html" %}\n'
@@ -281,7 +426,18 @@ def save_route_code(route_name, prompt):
         f"{html_code.strip()}\n"
         "{% endblock %}\n"
     )
-    write_to_file(html_file_path, wrapped_html)
 
+    # The two source files are independent, so overlap their writes; wall time is
+    # max(t1, t2) instead of t1 + t2. .result() re-raises any write error.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(write_to_file, python_file_path, python_code),
+            pool.submit(write_to_file, html_file_path, wrapped_html),
+        ]
+        for future in futures:
+            future.result()
+
+    # Register only once both files are on disk, so a failed write never leaves
+    # functions.json pointing at a missing module or template.
     update_functions_json(route_name)
     return f"/{route_name}_html"
@@ -17,30 +17,58 @@ Design notes
   add/update/delete) happen only on explicit POSTs or on a full page load.
 """
 from flask import (
-    Flask, render_template, request, Blueprint, jsonify, redirect, url_for
+    Flask, stream_template, request, Blueprint, jsonify, redirect, url_for
 )
 import requests
 import yfinance as yf
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import csv
+import io
+import itertools
 import json
+import logging
+import math
 import os
 import re
+import sqlite3
 import threading
+import time
+from concurrent.futures import (
+    Future, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+)
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
 
 My_Networth_blueprint = Blueprint('My_Networth_blueprint', __name__)
+logger = logging.getLogger(__name__)
 
 # Path to the data files
 DATA_DIR = Path(__file__).parent.parent / 'data'
 DATA_FILE = DATA_DIR / 'networth.json'
 HISTORY_FILE = DATA_DIR / 'networth_history.json'
 LEDGER_FILE = DATA_DIR / 'networth_ledger.json'
+PRICE_CACHE_FILE = DATA_DIR / 'price_cache.sqlite'
+FX_CACHE_FILE = DATA_DIR / 'fx_rates.json'
 
 CURRENCY_API_URL = 'https://api.exchangerate-api.com/v4/latest/USD'
 PRICE_TTL_SECONDS = 60 * 60 * 24      # refresh security prices at most once/day
 FX_TTL_SECONDS = 60 * 60             # cache FX rates for an hour
+FX_RETRY_AFTER_SECONDS = 60          # after a failed refresh, wait before retrying
+PRICE_CACHE_TTL_SECONDS = 15 * 60    # reuse a fetched quote for 15 minutes
 
 SUPPORTED_CURRENCIES = ('USD', 'EUR', 'INR', 'TRY', 'GBP')
+CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'INR': '₹', 'TRY': '₺', 'GBP': '£'}
+
+# Item lists an API request may target (``investments`` holds the first two).
+PORTFOLIO_CATEGORIES = frozenset({'stocks', 'cryptos', 'savings', 'loans', 'real_estate'})
+INVESTMENT_CATEGORIES = frozenset({'stocks', 'cryptos'})
 
 # Serialise all reads/writes of the data file to avoid corruption / races.
 _IO_LOCK = threading.RLock()
@@ -60,8 +88,15 @@ def now_iso():
 
 def parse_iso(value):
     """Parse timestamps written by this module (or the legacy format)."""
-    if not value:
+    if not value or not isinstance(value, str):
         return None
+    return _parse_iso_cached(value)
+
+
+@lru_cache(maxsize=256)
+def _parse_iso_cached(value):
+    # datetimes are immutable, so a memoised result is safe to share; the same
+    # stored timestamp strings are parsed again on every request.
     try:
         v = value.strip()
         # Legacy "Z" suffix -> proper offset
@@ -84,12 +119,22 @@ def parse_iso(value):
         return None
 
 
-def needs_refresh(last_updated_str, ttl_seconds=PRICE_TTL_SECONDS):
-    """True if last_updated is missing or older than ttl_seconds."""
-    dt = parse_iso(last_updated_str)
-    if dt is None:
-        return True
-    return (now_utc() - dt).total_seconds() > ttl_seconds
+def updated_epoch(portfolio_data):
+    """Epoch seconds of the portfolio's last save, or None if never saved.
+
+    Reads the numeric ``last_updated_epoch`` written by save_portfolio and
+    only parses the ISO ``last_updated`` for files saved before it existed.
+    """
+    epoch = portfolio_data.get('last_updated_epoch')
+    if isinstance(epoch, (int, float)):
+        return epoch
+    dt = parse_iso(portfolio_data.get('last_updated'))
+    return dt.timestamp() if dt else None
+
+
+def needs_refresh(epoch, ttl_seconds=PRICE_TTL_SECONDS):
+    """True if ``epoch`` is missing or older than ttl_seconds."""
+    return epoch is None or time.time() - epoch > ttl_seconds
 
 
 # ---------------------------------------------------------------------------
@@ -97,19 +142,7 @@ def needs_refresh(last_updated_str, ttl_seconds=PRICE_TTL_SECONDS):
 # ---------------------------------------------------------------------------
 
 def get_currency_symbol(currency):
-    return {
-        'USD': '$', 'EUR': '€', 'INR': '₹',
-        'TRY': '₺', 'GBP': '£',
-    }.get(currency, f"{currency} ")
-
-
-def _group_thousands(digits, sep):
-    out = []
-    while len(digits) > 3:
-        out.insert(0, digits[-3:])
-        digits = digits[:-3]
-    out.insert(0, digits)
-    return sep.join(out)
+    return CURRENCY_SYMBOLS.get(currency) or f"{currency} "
 
 
 def _group_indian(digits):
@@ -127,6 +160,9 @@ def _group_indian(digits):
     return ','.join(parts) + ',' + last3
 
 
+_EU_SEPARATORS = str.maketrans(',.', '.,')
+
+
 def format_currency_value(value, currency):
     """Format a number in its currency's conventional grouping.
 
@@ -140,47 +176,126 @@ def format_currency_value(value, currency):
         return str(value)
 
     negative = value < 0
-    value = abs(value)
-    int_part = str(int(round(value * 100)) // 100)
-    frac_part = f"{value:.2f}".split('.')[1]
+    # One rounding pass yields both halves, so 2509.995 becomes "2,509.99"
+    # rather than "2,510.99" from rounding the integer part and fraction apart.
+    text = f"{abs(value):,.2f}"
 
     if currency == 'INR':
-        grouped, dec = _group_indian(int_part), '.'
+        int_part, frac_part = text.split('.')
+        text = f"{_group_indian(int_part.replace(',', ''))}.{frac_part}"
     elif currency in ('EUR', 'TRY'):
-        grouped, dec = _group_thousands(int_part, '.'), ','
-    else:  # USD, GBP and anything else
-        grouped, dec = _group_thousands(int_part, ','), '.'
+        text = text.translate(_EU_SEPARATORS)
+    # USD, GBP and anything else keep the default "1,234.56".
 
-    return ('-' if negative else '') + f"{grouped}{dec}{frac_part}"
+    return ('-' if negative else '') + text
 
 
 # ---------------------------------------------------------------------------
 # FX rates (cached)
 # ---------------------------------------------------------------------------
 
-_FX_CACHE = {'rates': {}, 'fetched_at': None}
+# ``attempted_at`` is when the last refresh attempt finished (success or not);
+# ``failed_at`` is set while the most recent attempt failed.
+_FX_CACHE = {'rates': {}, 'fetched_at': None, 'attempted_at': None, 'failed_at': None}
+# Only one thread refreshes at a time; the rest wait and reuse its result
+# instead of stampeding the API when the cache expires.
+_FX_LOCK = threading.Lock()
+
+
+def _fx_fresh():
+    fetched = _FX_CACHE['fetched_at']
+    return bool(_FX_CACHE['rates']) and bool(fetched) and \
+        (now_utc() - fetched).total_seconds() < FX_TTL_SECONDS
+
+
+def _fx_backing_off():
+    failed = _FX_CACHE['failed_at']
+    return bool(failed) and (now_utc() - failed).total_seconds() < FX_RETRY_AFTER_SECONDS
+
+
+# The FX fetch runs while holding _FX_LOCK, so every page waits on it: keep the
+# worst case near the old single 10s call. One retry at most, never after a
+# read timeout; 3s to connect, 5s to read.
+FX_HTTP_TIMEOUT = (3, 5)
+
+
+def _build_http_session():
+    """Shared session: keep-alive connections plus one retry on transient errors."""
+    session = requests.Session()
+    retry = Retry(total=1, read=0, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset({'GET'}))
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_HTTP = _build_http_session()
 
 
 def get_fx_rates(force=False):
     """Return USD-based FX rates, cached for FX_TTL_SECONDS.
 
     exchangerate-api returns ``rates`` where 1 USD = rates[X] units of X.
-    On failure we reuse the last successful cache (or an empty dict).
+    On failure we reuse the last successful cache (or an empty dict), and
+    don't try again for FX_RETRY_AFTER_SECONDS unless ``force`` is set.
     """
-    fetched = _FX_CACHE['fetched_at']
-    fresh = fetched and (now_utc() - fetched).total_seconds() < FX_TTL_SECONDS
-    if _FX_CACHE['rates'] and fresh and not force:
+    if not force and (_fx_fresh() or _fx_backing_off()):
         return _FX_CACHE['rates']
+    requested_at = now_utc()
+    with _FX_LOCK:
+        # Another thread may have tried while we waited for the lock; reuse its
+        # outcome (fresh or stale rates) rather than repeating a failed call.
+        attempted = _FX_CACHE['attempted_at']
+        if (attempted and attempted >= requested_at) or \
+                (not force and (_fx_fresh() or _fx_backing_off())):
+            return _FX_CACHE['rates']
+        failed = True
+        try:
+            resp = _HTTP.get(CURRENCY_API_URL, timeout=FX_HTTP_TIMEOUT)
+            resp.raise_for_status()
+            rates = _json_loads(resp.content).get('rates', {})
+            if rates:
+                rates.setdefault('USD', 1.0)
+                _FX_CACHE['rates'] = rates
+                _FX_CACHE['fetched_at'] = now_utc()
+                failed = False
+                _save_fx_cache()
+        except Exception as e:
+            logger.warning("[FX] Could not refresh rates: %s", e)
+        finally:
+            _FX_CACHE['attempted_at'] = now_utc()
+            _FX_CACHE['failed_at'] = _FX_CACHE['attempted_at'] if failed else None
+        return _FX_CACHE['rates']
+
+
+def _save_fx_cache():
     try:
-        resp = requests.get(CURRENCY_API_URL, timeout=10)
-        rates = resp.json().get('rates', {})
-        if rates:
-            rates.setdefault('USD', 1.0)
-            _FX_CACHE['rates'] = rates
-            _FX_CACHE['fetched_at'] = now_utc()
-    except Exception as e:
-        print(f"[FX] Could not refresh rates: {e}")
-    return _FX_CACHE['rates']
+        _atomic_write(FX_CACHE_FILE, {'fetched_at': _FX_CACHE['fetched_at'].timestamp(),
+                                      'rates': _FX_CACHE['rates']})
+    except OSError as e:
+        logger.warning("[FX] Could not persist rates: %s", e)
+
+
+def _load_fx_cache():
+    """Seed the in-memory cache from the last rates written to disk.
+
+    Restarts (frequent under the dev reloader) then reuse rates that are
+    still within FX_TTL_SECONDS, and an offline start still has the last
+    known rates to fall back on instead of none.
+    """
+    try:
+        saved = _json_loads(FX_CACHE_FILE.read_bytes())
+        rates = saved['rates']
+        fetched = datetime.fromtimestamp(float(saved['fetched_at']), timezone.utc)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("[FX] Ignoring unreadable %s: %s", FX_CACHE_FILE.name, e)
+        return
+    if isinstance(rates, dict) and rates:
+        _FX_CACHE['rates'] = rates
+        _FX_CACHE['fetched_at'] = fetched
 
 
 def convert(amount, from_ccy, to_ccy, rates):
@@ -203,6 +318,21 @@ def to_usd(amount, ccy, rates):
     return convert(amount, ccy, 'USD', rates)
 
 
+def conversion_table(rates, to_ccy):
+    """Return ``{ccy: factor}`` multipliers into ``to_ccy``.
+
+    Lets a loop over many items resolve each rate with one dict lookup,
+    ``table.get(ccy, 1.0)``; the 1.0 default keeps unknown currencies as-is,
+    matching ``convert``.
+    """
+    to_rate = (rates or {}).get(to_ccy)
+    if not to_rate:
+        return {}
+    table = {ccy: to_rate / r for ccy, r in rates.items() if r}
+    table[to_ccy] = 1.0
+    return table
+
+
 # ---------------------------------------------------------------------------
 # Persistence
 # ---------------------------------------------------------------------------
@@ -221,61 +351,100 @@ def default_portfolio():
     }
 
 
+def _json_loads(blob):
+    return orjson.loads(blob) if orjson is not None else json.loads(blob)
+
+
+def _json_dumps(data):
+    """Indented UTF-8 JSON bytes; orjson when available, else stdlib."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
 def _atomic_write(path: Path, data):
-    """Write JSON atomically: temp file in the same dir, then os.replace."""
+    """Write JSON atomically: temp file in the same dir, then os.replace.
+
+    Returns the bytes written so callers can cache them.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + '.tmp')
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    blob = _json_dumps(data)
+    with open(tmp, 'wb') as f:
+        f.write(blob)
         f.flush()
         os.fsync(f.fileno())
     os.replace(tmp, path)
+    return blob
+
+
+# Needs _json_loads, so seed the FX cache only once the helpers exist.
+_load_fx_cache()
+
+
+# Raw bytes of networth.json keyed by (mtime_ns, size). Every load still
+# parses a fresh dict (callers mutate it), but an unchanged file is never
+# re-read from disk.
+_PORTFOLIO_CACHE = {'key': None, 'blob': None}
+
+
+def _stat_key(path):
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
 
 
 def load_portfolio():
     with _IO_LOCK:
-        if not DATA_FILE.exists():
+        try:
+            key = _stat_key(DATA_FILE)
+        except FileNotFoundError:
             return default_portfolio()
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            if _PORTFOLIO_CACHE['key'] != key:
+                _PORTFOLIO_CACHE['blob'] = DATA_FILE.read_bytes()
+                _PORTFOLIO_CACHE['key'] = key
+            return _json_loads(_PORTFOLIO_CACHE['blob'])
         except Exception as e:
-            print(f"Error loading networth data: {e}")
+            _PORTFOLIO_CACHE['key'] = None
+            logger.error("Error loading networth data: %s", e)
             return default_portfolio()
 
 
 def save_portfolio(portfolio_data):
     with _IO_LOCK:
         try:
-            portfolio_data['last_updated'] = now_iso()
-            _atomic_write(DATA_FILE, portfolio_data)
+            now = now_utc()
+            portfolio_data['last_updated'] = now.isoformat()
+            portfolio_data['last_updated_epoch'] = int(now.timestamp())
+            blob = _atomic_write(DATA_FILE, portfolio_data)
+            _PORTFOLIO_CACHE['blob'] = blob
+            _PORTFOLIO_CACHE['key'] = _stat_key(DATA_FILE)
         except Exception as e:
-            print(f"Error saving networth data: {e}")
+            _PORTFOLIO_CACHE['key'] = None
+            logger.error("Error saving networth data: %s", e)
 
 
 def load_history():
     with _IO_LOCK:
-        if not HISTORY_FILE.exists():
-            return []
         try:
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data if isinstance(data, list) else []
+            data = _json_loads(HISTORY_FILE.read_bytes())
+            return data if isinstance(data, list) else []
+        except FileNotFoundError:
+            return []
         except Exception as e:
-            print(f"Error loading history: {e}")
+            logger.error("Error loading history: %s", e)
             return []
 
 
 def load_ledger():
     with _IO_LOCK:
-        if not LEDGER_FILE.exists():
-            return []
         try:
-            with open(LEDGER_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data if isinstance(data, list) else []
+            data = _json_loads(LEDGER_FILE.read_bytes())
+            return data if isinstance(data, list) else []
+        except FileNotFoundError:
+            return []
         except Exception as e:
-            print(f"Error loading ledger: {e}")
+            logger.error("Error loading ledger: %s", e)
             return []
 
 
@@ -288,7 +457,7 @@ def append_ledger(entries):
         try:
             _atomic_write(LEDGER_FILE, ledger)
         except Exception as e:
-            print(f"Error saving ledger: {e}")
+            logger.error("Error saving ledger: %s", e)
 
 
 def record_adjustment(account, delta_native):
@@ -343,7 +512,7 @@ def backfill_ledger_institutions(portfolio_data=None):
             try:
                 _atomic_write(LEDGER_FILE, ledger)
             except Exception as e:
-                print(f"Error backfilling ledger: {e}")
+                logger.error("Error backfilling ledger: %s", e)
         return ledger
 
 
@@ -370,17 +539,33 @@ def record_snapshot(totals_usd):
         try:
             _atomic_write(HISTORY_FILE, history)
         except Exception as e:
-            print(f"Error saving history: {e}")
+            logger.error("Error saving history: %s", e)
 
 
 def get_next_id(category, existing_items):
-    existing_ids = {item.get('id', '') for item in existing_items}
-    counter = 1
-    while True:
-        new_id = f"{category}_{counter:03d}"
-        if new_id not in existing_ids:
-            return new_id
-        counter += 1
+    """Next ``<category>_NNN`` id: one past the highest number in use.
+
+    A single pass over the ids, and numbers freed by deletions are never
+    handed out again, so ledger entries that reference an old id can't be
+    attributed to a newer item.
+    """
+    return next(id_sequence(category, existing_items))
+
+
+def id_sequence(category, existing_items):
+    """Yield successive fresh ids for ``category``, scanning the items once.
+
+    For callers adding many items in a row, where calling get_next_id per
+    item would rescan the growing list each time.
+    """
+    prefix = f"{category}_"
+    highest = 0
+    for item in existing_items:
+        item_id = item.get('id', '')
+        if item_id.startswith(prefix) and item_id[len(prefix):].isdigit():
+            highest = max(highest, int(item_id[len(prefix):]))
+    for number in itertools.count(highest + 1):
+        yield f"{prefix}{number:03d}"
 
 
 # ---------------------------------------------------------------------------
@@ -455,9 +640,114 @@ def guard():
 _MINOR_UNITS = {'GBP': 'GBP', 'GBX': 'GBP', 'ZAC': 'ZAR', 'ILA': 'ILS'}
 
 
-def get_real_time_price(symbol, is_crypto=False):
+# Quotes survive restarts in a small SQLite cache keyed by (symbol, is_crypto),
+# each row carrying its own fetch time. One shared connection, serialised by
+# a lock; WAL keeps readers from blocking on the writer.
+_PRICE_DB = None
+_PRICE_DB_LOCK = threading.Lock()
+
+
+def _price_db():
+    global _PRICE_DB
+    if _PRICE_DB is None:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(PRICE_CACHE_FILE, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA cache_size=-64000')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS prices ('
+            ' symbol TEXT NOT NULL, is_crypto INTEGER NOT NULL,'
+            ' price REAL NOT NULL, currency TEXT NOT NULL,'
+            ' fetched_ts INTEGER NOT NULL,'
+            ' PRIMARY KEY (symbol, is_crypto))'
+        )
+        _PRICE_DB = conn
+    return _PRICE_DB
+
+
+def cached_prices(keys, max_age=PRICE_CACHE_TTL_SECONDS):
+    """Return ``{key: (price, currency)}`` for keys quoted within ``max_age``."""
+    keys = list(keys)
+    if not keys or max_age <= 0:
+        return {}
+    cutoff = int(time.time() - max_age)
+    wanted = set(keys)
+    try:
+        with _PRICE_DB_LOCK:
+            rows = _price_db().execute(
+                'SELECT symbol, is_crypto, price, currency FROM prices'
+                ' WHERE fetched_ts > ? AND symbol IN (%s)' % ','.join('?' * len(keys)),
+                [cutoff, *(sym for sym, _ in keys)],
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("Price cache read failed: %s", e)
+        return {}
+    hits = {}
+    for sym, is_crypto, price, ccy in rows:
+        key = (sym, bool(is_crypto))
+        if key in wanted:
+            hits[key] = (price, ccy)
+    return hits
+
+
+def store_prices(quotes):
+    """Record freshly fetched ``{key: (price, currency)}`` quotes."""
+    now = int(time.time())
+    rows = [(sym, int(is_crypto), price, ccy, now)
+            for (sym, is_crypto), (price, ccy) in quotes.items() if price is not None]
+    if not rows:
+        return
+    try:
+        with _PRICE_DB_LOCK:
+            with _price_db() as conn:
+                conn.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?)', rows)
+    except sqlite3.Error as e:
+        logger.warning("Price cache write failed: %s", e)
+
+
+# Lookups currently in flight, keyed by (symbol, is_crypto), so concurrent
+# requests for the same symbol share one upstream fetch.
+_INFLIGHT_PRICES = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def get_real_time_price(symbol, is_crypto=False, max_age=PRICE_CACHE_TTL_SECONDS):
     """Return (price, currency) for a symbol, or (None, None) on failure.
 
+    A quote cached within ``max_age`` seconds is returned without a network
+    call. If another thread is already fetching the same symbol, wait for its
+    result instead of issuing a duplicate request.
+    """
+    key = (symbol, is_crypto)
+    hit = cached_prices([key], max_age).get(key)
+    if hit is not None:
+        return hit
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT_PRICES.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _INFLIGHT_PRICES[key] = future
+    if not owner:
+        try:
+            return future.result(timeout=PRICE_FETCH_TIMEOUT_SECONDS)
+        except FuturesTimeout:
+            return None, None
+    try:
+        result = _fetch_real_time_price(symbol, is_crypto)
+        store_prices({key: result})
+        future.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT_PRICES.pop(key, None)
+        if not future.done():
+            future.set_result((None, None))
+
+
+def _fetch_real_time_price(symbol, is_crypto=False):
+    """Look up one symbol's (price, currency) from Yahoo.
+
     Uses fast_info (much faster and more reliable than .info), falling back
     to a 1-day history close if needed.
     """
@@ -490,10 +780,92 @@ def get_real_time_price(symbol, is_crypto=False):
             return None, None
         return float(price), (ccy or 'USD')
     except Exception as e:
-        print(f"Error fetching price for {symbol}: {e}")
+        logger.warning("Error fetching price for %s: %s", symbol, e)
         return None, None
 
 
+YF_BATCH_SIZE = 20                   # symbols per batched Yahoo download
+
+
+def get_real_time_prices_batch(symbols, is_crypto=False):
+    """Return ``{symbol: last_close}`` using one yf.download per 20 symbols.
+
+    ``download`` doesn't report the listing currency, so this is only used for
+    holdings whose quote currency is already known (see fetch_prices).
+    """
+    symbols = list(dict.fromkeys(symbols))
+    closes = {}
+    for i in range(0, len(symbols), YF_BATCH_SIZE):
+        chunk = symbols[i:i + YF_BATCH_SIZE]
+        tickers = [f"{s}-USD" if is_crypto else s for s in chunk]
+        try:
+            data = yf.download(tickers=tickers, period='5d', interval='1d',
+                               progress=False, threads=True)
+        except Exception as e:
+            logger.warning("Batch price download failed for %s: %s", ' '.join(tickers), e)
+            continue
+        if data is None or data.empty:
+            continue
+        close = data['Close']
+        for symbol, ticker_symbol in zip(chunk, tickers):
+            # One column per ticker; older yfinance returns a Series for one ticker.
+            if hasattr(close, 'columns'):
+                if ticker_symbol not in close.columns:
+                    continue
+                series = close[ticker_symbol].dropna()
+            else:
+                series = close.dropna()
+            if not series.empty:
+                closes[symbol] = float(series.iloc[-1])
+    return closes
+
+
+# Quote lookups are independent blocking HTTP round-trips, so fan them out.
+PRICE_FETCH_WORKERS = 8
+PRICE_FETCH_TIMEOUT_SECONDS = 30     # overall budget for one batch of lookups
+
+
+def fetch_prices(keys, known_currencies=None, max_age=PRICE_CACHE_TTL_SECONDS):
+    """Fetch quotes for many ``(symbol, is_crypto)`` keys.
+
+    Quotes cached within ``max_age`` seconds are reused. Of the rest, crypto
+    pairs (always quoted in USD) and stocks with an entry in
+    ``known_currencies`` are priced by batched downloads; the remainder (and
+    any the batch missed) are looked up individually on a thread pool. Returns ``{key: (price, currency)}``. Lookups that fail or
+    miss the overall deadline map to ``(None, None)`` so callers keep their
+    old values.
+    """
+    keys = list(dict.fromkeys(keys))
+    quotes = {key: (None, None) for key in keys}
+    quotes.update(cached_prices(keys, max_age))
+    known_currencies = dict(known_currencies or {})
+    known_currencies.update({key: 'USD' for key in keys if key[1]})
+    for is_crypto in (False, True):
+        batch = [sym for (sym, ic) in keys
+                 if ic == is_crypto and (sym, ic) in known_currencies and quotes[(sym, ic)][0] is None]
+        if batch:
+            fetched = {(sym, is_crypto): (price, known_currencies[(sym, is_crypto)])
+                       for sym, price in get_real_time_prices_batch(batch, is_crypto).items()}
+            store_prices(fetched)
+            quotes.update(fetched)
+
+    missing = [key for key in keys if quotes[key][0] is None]
+    if not missing:
+        return quotes
+    pool = ThreadPoolExecutor(max_workers=min(PRICE_FETCH_WORKERS, len(missing)))
+    futures = {pool.submit(get_real_time_price, symbol, is_crypto, 0): (symbol, is_crypto)
+               for symbol, is_crypto in missing}
+    try:
+        for future in as_completed(futures, timeout=PRICE_FETCH_TIMEOUT_SECONDS):
+            quotes[futures[future]] = future.result()
+    except FuturesTimeout:
+        pending = sum(not f.done() for f in futures)
+        logger.warning("Timed out fetching %d of %d prices", pending, len(futures))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return quotes
+
+
 def price_to_usd(price, ccy, rates):
     """Normalise a quoted price (possibly in a minor unit / foreign ccy) to USD."""
     if price is None:
@@ -510,24 +882,50 @@ def price_to_usd(price, ccy, rates):
     return to_usd(price, ccy, rates)
 
 
-def update_portfolio_prices(stocks, cryptos, rates):
-    """Refresh market values (stored canonically in USD). Returns errors list."""
+def update_portfolio_prices(stocks, cryptos, rates, max_age=PRICE_CACHE_TTL_SECONDS):
+    """Refresh market values (stored canonically in USD). Returns errors list.
+
+    Pass ``max_age=0`` to ignore the price cache and re-quote everything.
+    """
+    quotes = fetch_portfolio_quotes(stocks, cryptos, max_age)
+    return apply_portfolio_quotes(stocks, cryptos, quotes, rates)
+
+
+def fetch_portfolio_quotes(stocks, cryptos, max_age=PRICE_CACHE_TTL_SECONDS):
+    """Quote every holding. Needs no FX rates, so it can overlap their fetch."""
+    return fetch_prices([(s['symbol'], False) for s in stocks]
+                        + [(c['symbol'], True) for c in cryptos],
+                        known_stock_currencies(stocks), max_age)
+
+
+def known_stock_currencies(stocks):
+    """``{(symbol, False): currency}`` for holdings whose listing currency is known.
+
+    Stocks remember the currency they were last quoted in, so they can be
+    priced by a batched download instead of one lookup each.
+    """
+    return {(s['symbol'], False): s['price_currency'] for s in stocks if s.get('price_currency')}
+
+
+def apply_portfolio_quotes(stocks, cryptos, quotes, rates):
+    """Write quotes from ``fetch_portfolio_quotes`` back as USD market values."""
     errors = []
+    stamp = now_iso()  # one refresh, one timestamp
     for stock in stocks:
-        price, ccy = get_real_time_price(stock['symbol'], is_crypto=False)
+        price, ccy = quotes[(stock['symbol'], False)]
         usd = price_to_usd(price, ccy, rates)
         if usd is not None:
             stock['market_value'] = usd * stock['shares']
             stock['price_currency'] = ccy
-            stock['last_updated'] = now_iso()
+            stock['last_updated'] = stamp
         else:
             errors.append(f"Could not update price for stock {stock['symbol']}")
     for crypto in cryptos:
-        price, ccy = get_real_time_price(crypto['symbol'], is_crypto=True)
+        price, ccy = quotes[(crypto['symbol'], True)]
         usd = price_to_usd(price, ccy, rates)
         if usd is not None:
             crypto['market_value'] = usd * crypto['amount']
-            crypto['last_updated'] = now_iso()
+            crypto['last_updated'] = stamp
         else:
             errors.append(f"Could not update price for cryptocurrency {crypto['symbol']}")
     return errors
@@ -586,6 +984,7 @@ def calculate_next_due_date(current_date_str, frequency):
 
 # Frequency -> number of occurrences per month (for steady-state cash flow).
 MONTHLY_FACTOR = {'weekly': 52.0 / 12.0, 'monthly': 1.0, 'quarterly': 1.0 / 3.0, 'yearly': 1.0 / 12.0}
+FREQUENCIES = frozenset(MONTHLY_FACTOR)
 
 
 def _to_date(value):
@@ -694,6 +1093,7 @@ def apply_due_transactions(portfolio_data):
     """
     rates = get_fx_rates()
     today = now_utc().date()
+    stamp = now_iso()  # every posting in this run shares one timestamp
     accounts = {a['id']: a for a in portfolio_data.get('savings', [])}
     recurring = portfolio_data.get('recurring_transactions', {'income': [], 'expenses': []})
     counter = len(load_ledger())
@@ -714,7 +1114,7 @@ def apply_due_transactions(portfolio_data):
                 delta = sign * convert(it['amount'], it['currency'], acct['currency'], rates)
                 acct['balance'] += delta
                 acct['balance_usd'] = to_usd(acct['balance'], acct['currency'], rates)
-                acct['last_updated'] = now_iso()
+                acct['last_updated'] = stamp
                 counter += 1
                 new_entries.append({
                     'id': f"ledger_{counter:04d}",
@@ -729,7 +1129,7 @@ def apply_due_transactions(portfolio_data):
                     'account_currency': acct['currency'],
                     'delta_account': round(delta, 2),
                     'resulting_balance': round(acct['balance'], 2),
-                    'applied_at': now_iso(),
+                    'applied_at': stamp,
                 })
             it['last_processed'] = today.isoformat()
             it['next_due_date'] = new_next
@@ -749,13 +1149,14 @@ def build_recurring_summary(portfolio_data, rates, display_currency, horizon_mon
     today = now_utc().date()
     income = portfolio_data.get('recurring_transactions', {}).get('income', [])
     expenses = portfolio_data.get('recurring_transactions', {}).get('expenses', [])
+    to_disp = conversion_table(rates, display_currency)
 
     def monthly_rate(items):
         total = 0.0
         for it in items:
             if not is_active_on(it, today):
                 continue
-            total += convert(it['amount'], it['currency'], display_currency, rates) * MONTHLY_FACTOR.get(it.get('frequency'), 0)
+            total += it['amount'] * to_disp.get(it['currency'], 1.0) * MONTHLY_FACTOR.get(it.get('frequency'), 0)
         return total
 
     monthly_income = monthly_rate(income)
@@ -778,12 +1179,12 @@ def build_recurring_summary(portfolio_data, rates, display_currency, horizon_mon
 
     events = []  # (date, signed_amount_display, name, type, account_name, institution)
     for it in income:
-        amt = convert(it['amount'], it['currency'], display_currency, rates)
+        amt = it['amount'] * to_disp.get(it['currency'], 1.0)
         aname, ainst = acct_info(it, 'target_account_id')
         for d in generate_occurrences(it, horizon, from_date=forecast_start):
             events.append((d, amt, it['name'], 'income', aname, ainst))
     for it in expenses:
-        amt = convert(it['amount'], it['currency'], display_currency, rates)
+        amt = it['amount'] * to_disp.get(it['currency'], 1.0)
         aname, ainst = acct_info(it, 'source_account_id')
         for d in generate_occurrences(it, horizon, from_date=forecast_start):
             events.append((d, -amt, it['name'], 'expense', aname, ainst))
@@ -793,14 +1194,18 @@ def build_recurring_summary(portfolio_data, rates, display_currency, horizon_mon
     current_nw = totals['grand_total']
     liquid_savings = totals['savings']
 
-    # Month-end projection points.
+    # Month-end projection points. Events are sorted and boundaries only move
+    # forward, so one running total walks the events once for all months.
     projection = [{'date': today.isoformat(), 'net_worth': round(current_nw, 2)}]
+    cum, pos = 0.0, 0
     for m in range(1, horizon_months + 1):
         total_month_index = (today.month - 1) + m
         year = today.year + total_month_index // 12
         month = total_month_index % 12 + 1
         boundary = _month_end(year, month)
-        cum = sum(amt for (d, amt, *_rest) in events if d <= boundary)
+        while pos < len(events) and events[pos][0] <= boundary:
+            cum += events[pos][1]
+            pos += 1
         projection.append({'date': boundary.isoformat(), 'net_worth': round(current_nw + cum, 2)})
 
     upcoming = [{'date': d.isoformat(), 'name': n, 'amount': round(amt, 2), 'type': t,
@@ -843,6 +1248,7 @@ CODE_COUNTRY = {'DE': 'Germany', 'IN': 'India', 'LU': 'Luxembourg', 'US': 'Unite
 def build_allocation(portfolio_data, rates, display_currency):
     """Asset allocation by class, currency and country/region (display currency)."""
     p = build_payload(portfolio_data, display_currency, rates)
+    to_disp = conversion_table(rates, display_currency)
 
     def bucketize(pairs):
         agg = {}
@@ -858,7 +1264,7 @@ def build_allocation(portfolio_data, rates, display_currency):
     def add_class(label, items, name_key, value_key):
         arr = [{'name': it.get(name_key) or '—', 'value': round(it[value_key], 2)}
                for it in items if it[value_key] > 0]
-        total = sum(x['value'] for x in arr)
+        total = math.fsum(x['value'] for x in arr)
         if total > 0:
             by_class.append({'label': label, 'value': round(total, 2),
                              'items': sorted(arr, key=lambda x: -x['value'])})
@@ -887,7 +1293,7 @@ def build_allocation(portfolio_data, rates, display_currency):
     for a in portfolio_data.get('savings', []):
         code = (a.get('name') or '').strip().upper()
         country = CODE_COUNTRY.get(code) or CURRENCY_REGION.get(a['currency'], 'Other')
-        country_pairs.append((country, convert(a['balance'], a['currency'], display_currency, rates)))
+        country_pairs.append((country, a['balance'] * to_disp.get(a['currency'], 1.0)))
     for r in p['real_estate']:
         country_pairs.append((CURRENCY_REGION.get(r['currency'], 'Other'), r['display_value']))
     for s in p['stocks']:
@@ -899,7 +1305,7 @@ def build_allocation(portfolio_data, rates, display_currency):
     return {
         'currency': display_currency,
         'net_worth': p['totals']['grand_total'],
-        'total_assets': round(sum(c['value'] for c in by_class), 2),
+        'total_assets': round(math.fsum(c['value'] for c in by_class), 2),
         'by_class': by_class,
         'by_currency': by_currency,
         'by_country': by_country,
@@ -911,6 +1317,7 @@ def build_cashflow(portfolio_data, rates, display_currency, months_back=6, month
     today = now_utc().date()
     income = portfolio_data.get('recurring_transactions', {}).get('income', [])
     expenses = portfolio_data.get('recurring_transactions', {}).get('expenses', [])
+    to_disp = conversion_table(rates, display_currency)
 
     def month_key(d):
         return f"{d.year:04d}-{d.month:02d}"
@@ -931,7 +1338,7 @@ def build_cashflow(portfolio_data, rates, display_currency, months_back=6, month
         k = month_key(d)
         if k not in buckets:
             continue
-        amt = convert(e['amount'], e['currency'], display_currency, rates)
+        amt = e['amount'] * to_disp.get(e['currency'], 1.0)
         if e['type'] == 'income':
             buckets[k]['income'] += amt
         else:
@@ -941,13 +1348,13 @@ def build_cashflow(portfolio_data, rates, display_currency, months_back=6, month
     horizon = today + timedelta(days=int(31 * months_fwd) + 5)
     fstart = today + timedelta(days=1)
     for it in income:
-        amt = convert(it['amount'], it['currency'], display_currency, rates)
+        amt = it['amount'] * to_disp.get(it['currency'], 1.0)
         for d in generate_occurrences(it, horizon, from_date=fstart):
             k = month_key(d)
             if k in buckets:
                 buckets[k]['income'] += amt
     for it in expenses:
-        amt = convert(it['amount'], it['currency'], display_currency, rates)
+        amt = it['amount'] * to_disp.get(it['currency'], 1.0)
         for d in generate_occurrences(it, horizon, from_date=fstart):
             k = month_key(d)
             if k in buckets:
@@ -980,7 +1387,6 @@ def _goal_status(portfolio_data, current_nw, monthly_net, display_currency, rate
         'months_to_go': None,
     }
     if current_nw < target_display and monthly_net > 0:
-        import math
         months = math.ceil((target_display - current_nw) / monthly_net)
         idx = (today.year * 12 + today.month - 1) + months
         result['months_to_go'] = months
@@ -1000,6 +1406,14 @@ def build_payload(portfolio_data, display_currency, rates):
     loans = portfolio_data.get('loans', [])
     real_estate = portfolio_data.get('real_estate', [])
 
+    # Resolve every currency's rate once instead of per item.
+    to_usd_f = conversion_table(rates, 'USD')
+    to_disp = to_usd_f if display_currency == 'USD' else conversion_table(rates, display_currency)
+    usd_to_disp = to_disp.get('USD', 1.0)
+
+    def disp(usd):
+        return round(usd * usd_to_disp, 2)
+
     stocks_out, cryptos_out = [], []
     stocks_usd = cryptos_usd = 0.0
     for s in stocks:
@@ -1007,52 +1421,52 @@ def build_payload(portfolio_data, display_currency, rates):
         stocks_usd += usd
         stocks_out.append({'id': s['id'], 'symbol': s['symbol'], 'shares': s['shares'],
                            'currency': s.get('price_currency', 'USD'),
-                           'market_value': round(convert(usd, 'USD', display_currency, rates), 2)})
+                           'market_value': disp(usd)})
     for c in cryptos:
         usd = c['market_value']
         cryptos_usd += usd
         cryptos_out.append({'id': c['id'], 'symbol': c['symbol'], 'amount': c['amount'],
                             'currency': 'USD',
-                            'market_value': round(convert(usd, 'USD', display_currency, rates), 2)})
+                            'market_value': disp(usd)})
 
     savings_out, savings_usd = [], 0.0
     for a in savings:
-        usd = to_usd(a['balance'], a['currency'], rates)
+        usd = a['balance'] * to_usd_f.get(a['currency'], 1.0)
         savings_usd += usd
         savings_out.append({'id': a['id'], 'name': a['name'], 'balance': a['balance'],
                             'currency': a['currency'],
-                            'display_value': round(convert(a['balance'], a['currency'], display_currency, rates), 2),
+                            'display_value': round(a['balance'] * to_disp.get(a['currency'], 1.0), 2),
                             'institution': a.get('institution', ''),
                             'account_type': a.get('account_type', 'checking')})
 
     loans_out, loans_usd = [], 0.0
     for l in loans:
-        usd = to_usd(l['outstanding_principal'], l['currency'], rates)
+        factor = to_disp.get(l['currency'], 1.0)
+        usd = l['outstanding_principal'] * to_usd_f.get(l['currency'], 1.0)
         loans_usd += usd
         loans_out.append({'id': l['id'], 'name': l['name'],
                           'outstanding_principal': l['outstanding_principal'], 'currency': l['currency'],
-                          'display_value': round(-convert(l['outstanding_principal'], l['currency'], display_currency, rates), 2),
+                          'display_value': round(-l['outstanding_principal'] * factor, 2),
                           'interest_rate': l.get('interest_rate', 0), 'loan_type': l.get('loan_type', ''),
                           'linked_property_id': l.get('linked_property_id'),
                           'monthly_payment': l.get('monthly_payment')})
 
     re_out, re_usd = [], 0.0
     for p in real_estate:
-        market_usd = to_usd(p['market_value'], p['currency'], rates)
+        market_usd = p['market_value'] * to_usd_f.get(p['currency'], 1.0)
         equity_usd = compute_equity_usd(p, loans, rates)
         re_usd += market_usd
         re_out.append({'id': p['id'], 'name': p['name'], 'market_value': p['market_value'],
                        'currency': p['currency'],
-                       'display_value': round(convert(market_usd, 'USD', display_currency, rates), 2),
-                       'equity': round(convert(equity_usd, 'USD', display_currency, rates), 2),
+                       'display_value': disp(market_usd),
+                       'equity': disp(equity_usd),
                        'property_type': p.get('property_type', ''), 'address': p.get('address', ''),
                        'mortgage_loan_ids': p.get('mortgage_loan_ids', [])})
 
-    def disp(usd):
-        return round(convert(usd, 'USD', display_currency, rates), 2)
-
     net_cash_usd = savings_usd - loans_usd
-    grand_usd = stocks_usd + cryptos_usd + net_cash_usd + re_usd
+    # fsum keeps the mixed-sign grand total exact to the last cent, whatever
+    # the magnitudes of the assets and the loans netted against them.
+    grand_usd = math.fsum((stocks_usd, cryptos_usd, savings_usd, -loans_usd, re_usd))
 
     totals_usd = {'stocks': stocks_usd, 'cryptos': cryptos_usd, 'savings': savings_usd,
                   'loans': -loans_usd, 'real_estate': re_usd, 'net_cash': net_cash_usd,
@@ -1061,8 +1475,9 @@ def build_payload(portfolio_data, display_currency, rates):
               'loans': disp(-loans_usd), 'real_estate': disp(re_usd), 'net_cash': disp(net_cash_usd),
               'grand_total': disp(grand_usd)}
 
-    lu = parse_iso(portfolio_data.get('last_updated'))
-    last_updated_display = lu.strftime("%Y-%m-%d %H:%M UTC") if lu else None
+    epoch = updated_epoch(portfolio_data)
+    last_updated_display = (datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+                            if epoch is not None else None)
 
     return {
         'stocks': stocks_out, 'cryptos': cryptos_out, 'savings': savings_out,
@@ -1099,11 +1514,14 @@ def api_portfolio():
 def api_portfolio_history():
     """Net-worth history (stored in USD) converted to the requested currency."""
     display_currency = (request.args.get('currency') or 'USD').upper()
-    rates = get_fx_rates()
+    # Snapshots are all USD, so a USD view needs no rates (and no FX call).
+    factor = 1.0
+    if display_currency != 'USD':
+        factor = conversion_table(get_fx_rates(), display_currency).get('USD', 1.0)
     history = load_history()
 
     def conv(v):
-        return round(convert(v, 'USD', display_currency, rates), 2)
+        return round((v or 0.0) * factor, 2)
 
     series = []
     for h in history:
@@ -1179,10 +1597,15 @@ def api_portfolio_refresh():
     if denied:
         return denied
     portfolio_data = load_portfolio()
-    rates = get_fx_rates(force=True)
     stocks = portfolio_data.get('investments', {}).get('stocks', [])
     cryptos = portfolio_data.get('investments', {}).get('cryptos', [])
-    errors = update_portfolio_prices(stocks, cryptos, rates)
+    # FX and quotes are independent round-trips; run them side by side so the
+    # refresh costs the slower of the two rather than their sum.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        fx = pool.submit(get_fx_rates, True)
+        quotes = fetch_portfolio_quotes(stocks, cryptos, max_age=0)
+        rates = fx.result()
+    errors = apply_portfolio_quotes(stocks, cryptos, quotes, rates)
     save_portfolio(portfolio_data)
 
     display_currency = (request.args.get('currency') or portfolio_data.get('currency', 'USD')).upper()
@@ -1204,11 +1627,11 @@ def api_portfolio_delete():
         item_id = body.get('id')
     except Exception as e:
         return jsonify({'error': f'Invalid request: {e}'}), 400
-    if category not in ('stocks', 'cryptos', 'savings', 'loans', 'real_estate'):
+    if not isinstance(category, str) or category not in PORTFOLIO_CATEGORIES:
         return jsonify({'error': 'Invalid category'}), 400
 
     portfolio_data = load_portfolio()
-    if category in ('stocks', 'cryptos'):
+    if category in INVESTMENT_CATEGORIES:
         items = portfolio_data.get('investments', {}).get(category, [])
         updated = [i for i in items if i.get('id') != item_id]
         if len(updated) == len(items):
@@ -1240,7 +1663,7 @@ def api_portfolio_add():
         category = body.get('category')
     except Exception as e:
         return jsonify({'error': f'Invalid request: {e}'}), 400
-    if category not in ('stocks', 'cryptos', 'savings', 'loans', 'real_estate'):
+    if not isinstance(category, str) or category not in PORTFOLIO_CATEGORIES:
         return jsonify({'error': 'Invalid category'}), 400
 
     portfolio_data = load_portfolio()
@@ -1347,12 +1770,12 @@ def api_portfolio_update():
         item_id = body.get('id')
     except Exception as e:
         return jsonify({'error': f'Invalid request: {e}'}), 400
-    if category not in ('stocks', 'cryptos', 'savings', 'loans', 'real_estate'):
+    if not isinstance(category, str) or category not in PORTFOLIO_CATEGORIES:
         return jsonify({'error': 'Invalid category'}), 400
 
     portfolio_data = load_portfolio()
     rates = get_fx_rates()
-    if category in ('stocks', 'cryptos'):
+    if category in INVESTMENT_CATEGORIES:
         items = portfolio_data.get('investments', {}).get(category, [])
     else:
         items = portfolio_data.get(category, [])
@@ -1468,7 +1891,7 @@ def _add_recurring(kind, account_field):
         if not any(a['id'] == body[account_field] for a in portfolio_data.get('savings', [])):
             return jsonify({'error': 'Account not found'}), 400
         frequency = body['frequency'].strip().lower()
-        if frequency not in ('weekly', 'monthly', 'quarterly', 'yearly'):
+        if frequency not in FREQUENCIES:
             return jsonify({'error': f'Unsupported frequency: {frequency}'}), 400
         amount = float(body['amount'])
         if amount <= 0:
@@ -1553,7 +1976,7 @@ def api_recurring_update():
             item[account_field] = body[account_field]
         if 'frequency' in body:
             freq = body['frequency'].strip().lower()
-            if freq not in ('weekly', 'monthly', 'quarterly', 'yearly'):
+            if freq not in FREQUENCIES:
                 return jsonify({'error': f'Unsupported frequency: {freq}'}), 400
             item['frequency'] = freq
         # If the schedule changed, restart it from the (new) start date.
@@ -1608,13 +2031,13 @@ def api_recurring_ledger():
     """Posting history (most recent first), with each amount shown in display currency."""
     portfolio_data = load_portfolio()
     display_currency = (request.args.get('currency') or portfolio_data.get('currency', 'USD')).upper()
-    rates = get_fx_rates()
+    to_disp = conversion_table(get_fx_rates(), display_currency)
     ledger = backfill_ledger_institutions(portfolio_data)
     out = []
     for e in reversed(ledger[-200:]):
         signed_native = e['amount'] * (1 if e['type'] == 'income' else -1)
         out.append({**e, 'account_institution': e.get('account_institution', ''),
-                    'display_amount': round(convert(signed_native, e['currency'], display_currency, rates), 2)})
+                    'display_amount': round(signed_native * to_disp.get(e['currency'], 1.0), 2)})
     return jsonify({'currency': display_currency, 'ledger': out})
 
 
@@ -1635,107 +2058,123 @@ def api_recurring_apply():
 # Legacy textarea form parsing (page POST)
 # ---------------------------------------------------------------------------
 
+def _form_rows(field, min_cols):
+    """Yield the stripped cells of each row in a form textarea.
+
+    csv.reader (C-implemented) honours quoting, so a name or address may
+    contain commas: ``"Flat 2, High St", 250000, GBP``. Blank lines and rows
+    with fewer than ``min_cols`` cells are skipped, so callers can unpack them
+    directly; rows of empty cells (``" , "``) still reach the callers' checks.
+    """
+    for row in csv.reader(io.StringIO(request.form.get(field, '')), skipinitialspace=True):
+        if not row:
+            continue
+        parts = [p.strip() for p in row]
+        if len(parts) >= min_cols:
+            yield parts
+
+
 def _parse_form_lines(portfolio_data, rates, errors):
     """Parse the multi-line textareas on the page form and append entries."""
+    # Resolve every target list once rather than per appended row.
     inv = portfolio_data.setdefault('investments', {'stocks': [], 'cryptos': []})
+    stocks = inv.setdefault('stocks', [])
+    cryptos = inv.setdefault('cryptos', [])
+    savings = portfolio_data.setdefault('savings', [])
+    loans = portfolio_data.setdefault('loans', [])
+    real_estate = portfolio_data.setdefault('real_estate', [])
+    ids = {'stock': id_sequence('stock', stocks), 'crypto': id_sequence('crypto', cryptos),
+           'saving': id_sequence('saving', savings), 'loan': id_sequence('loan', loans),
+           'realestate': id_sequence('realestate', real_estate)}
+    usd_factor = conversion_table(rates, 'USD')  # native -> USD, one lookup per row
+    stamp = now_iso()  # everything added by one submission shares a timestamp
+
+    # Parse every holding first, then quote them all in one fetch_prices call
+    # (batched where the currency is known, concurrent otherwise) instead of
+    # one blocking lookup per row.
+    stock_rows, crypto_rows = [], []
+    for symbol, shares, *_ in _form_rows('stocks', 2):
+        symbol = symbol.upper()
+        try:
+            stock_rows.append((symbol, float(shares)))
+        except ValueError:
+            errors.append(f"Invalid share count for {symbol}")
+
+    for symbol, amount, *_ in _form_rows('cryptos', 2):
+        symbol = symbol.upper()
+        try:
+            crypto_rows.append((symbol, float(amount)))
+        except ValueError:
+            errors.append(f"Invalid amount for {symbol}")
+
+    quotes = fetch_prices([(symbol, False) for symbol, _ in stock_rows]
+                          + [(symbol, True) for symbol, _ in crypto_rows],
+                          known_stock_currencies(stocks))
 
-    for line in request.form.get('stocks', '').splitlines():
-        parts = [p.strip() for p in line.split(',') if p.strip() != '' or True]
-        if not line.strip():
+    for symbol, shares in stock_rows:
+        price, ccy = quotes[(symbol, False)]
+        usd = price_to_usd(price, ccy, rates)
+        if usd is None:
+            errors.append(f"Could not fetch price for stock {symbol}")
             continue
-        parts = [p.strip() for p in line.split(',')]
-        if len(parts) >= 2:
-            symbol = parts[0].upper()
-            try:
-                shares = float(parts[1])
-            except ValueError:
-                errors.append(f"Invalid share count for {symbol}")
-                continue
-            price, ccy = get_real_time_price(symbol, is_crypto=False)
-            usd = price_to_usd(price, ccy, rates)
-            if usd is None:
-                errors.append(f"Could not fetch price for stock {symbol}")
-                continue
-            inv['stocks'].append({'id': get_next_id('stock', inv['stocks']), 'symbol': symbol,
-                                  'shares': shares, 'currency': 'USD', 'price_currency': ccy,
-                                  'market_value': usd * shares, 'last_updated': now_iso()})
+        stocks.append({'id': next(ids['stock']), 'symbol': symbol,
+                       'shares': shares, 'currency': 'USD', 'price_currency': ccy,
+                       'market_value': usd * shares, 'last_updated': stamp})
 
-    for line in request.form.get('cryptos', '').splitlines():
-        if not line.strip():
+    for symbol, amount in crypto_rows:
+        price, ccy = quotes[(symbol, True)]
+        usd = price_to_usd(price, ccy, rates)
+        if usd is None:
+            errors.append(f"Could not fetch price for cryptocurrency {symbol}")
             continue
-        parts = [p.strip() for p in line.split(',')]
-        if len(parts) >= 2:
-            symbol = parts[0].upper()
-            try:
-                amount = float(parts[1])
-            except ValueError:
-                errors.append(f"Invalid amount for {symbol}")
-                continue
-            price, ccy = get_real_time_price(symbol, is_crypto=True)
-            usd = price_to_usd(price, ccy, rates)
-            if usd is None:
-                errors.append(f"Could not fetch price for cryptocurrency {symbol}")
-                continue
-            inv['cryptos'].append({'id': get_next_id('crypto', inv['cryptos']), 'symbol': symbol,
-                                   'amount': amount, 'currency': 'USD',
-                                   'market_value': usd * amount, 'last_updated': now_iso()})
+        cryptos.append({'id': next(ids['crypto']), 'symbol': symbol,
+                        'amount': amount, 'currency': 'USD',
+                        'market_value': usd * amount, 'last_updated': stamp})
 
-    for line in request.form.get('savings', '').splitlines():
-        if not line.strip():
+    for name, balance, currency, *extra in _form_rows('savings', 3):
+        try:
+            balance = float(balance)
+        except ValueError:
+            errors.append(f"Invalid balance for {name}")
             continue
-        parts = [p.strip() for p in line.split(',')]
-        if len(parts) >= 3:
-            try:
-                balance = float(parts[1])
-            except ValueError:
-                errors.append(f"Invalid balance for {parts[0]}")
-                continue
-            currency = parts[2].upper()
-            portfolio_data.setdefault('savings', []).append({
-                'id': get_next_id('saving', portfolio_data.get('savings', [])),
-                'name': parts[0], 'balance': balance, 'currency': currency,
-                'balance_usd': to_usd(balance, currency, rates),
-                'institution': parts[3] if len(parts) >= 4 else parts[0],
-                'account_type': 'checking', 'last_updated': now_iso()})
-
-    for line in request.form.get('loans', '').splitlines():
-        if not line.strip():
+        currency = currency.upper()
+        savings.append({
+            'id': next(ids['saving']),
+            'name': name, 'balance': balance, 'currency': currency,
+            'balance_usd': balance * usd_factor.get(currency, 1.0),
+            'institution': extra[0] if extra else name,
+            'account_type': 'checking', 'last_updated': stamp})
+
+    for name, outstanding, currency, *extra in _form_rows('loans', 3):
+        try:
+            outstanding = float(outstanding)
+            interest = float(extra[0]) if extra else 0.0
+        except ValueError:
+            errors.append(f"Invalid number for loan {name}")
             continue
-        parts = [p.strip() for p in line.split(',')]
-        if len(parts) >= 3:
-            try:
-                outstanding = float(parts[1])
-                interest = float(parts[3]) if len(parts) >= 4 else 0.0
-            except ValueError:
-                errors.append(f"Invalid number for loan {parts[0]}")
-                continue
-            currency = parts[2].upper()
-            portfolio_data.setdefault('loans', []).append({
-                'id': get_next_id('loan', portfolio_data.get('loans', [])),
-                'name': parts[0], 'outstanding_principal': outstanding, 'currency': currency,
-                'outstanding_usd': to_usd(outstanding, currency, rates),
-                'interest_rate': interest, 'lender': 'Bank', 'loan_type': 'personal',
-                'monthly_payment': None, 'principal_amount': None, 'start_date': None,
-                'term_months': None, 'linked_property_id': None, 'last_updated': now_iso()})
-
-    for line in request.form.get('real_estate', '').splitlines():
-        if not line.strip():
+        currency = currency.upper()
+        loans.append({
+            'id': next(ids['loan']),
+            'name': name, 'outstanding_principal': outstanding, 'currency': currency,
+            'outstanding_usd': outstanding * usd_factor.get(currency, 1.0),
+            'interest_rate': interest, 'lender': 'Bank', 'loan_type': 'personal',
+            'monthly_payment': None, 'principal_amount': None, 'start_date': None,
+            'term_months': None, 'linked_property_id': None, 'last_updated': stamp})
+
+    for name, market_value, currency, *extra in _form_rows('real_estate', 3):
+        try:
+            market_value = float(market_value)
+        except ValueError:
+            errors.append(f"Invalid market value for {name}")
             continue
-        parts = [p.strip() for p in line.split(',')]
-        if len(parts) >= 3:
-            try:
-                market_value = float(parts[1])
-            except ValueError:
-                errors.append(f"Invalid market value for {parts[0]}")
-                continue
-            currency = parts[2].upper()
-            portfolio_data.setdefault('real_estate', []).append({
-                'id': get_next_id('realestate', portfolio_data.get('real_estate', [])),
-                'name': parts[0], 'market_value': market_value, 'currency': currency,
-                'market_value_usd': to_usd(market_value, currency, rates),
-                'address': parts[3] if len(parts) >= 4 else 'Not specified',
-                'purchase_price': None, 'purchase_date': None, 'property_type': 'residential',
-                'mortgage_loan_ids': [], 'last_updated': now_iso()})
+        currency = currency.upper()
+        real_estate.append({
+            'id': next(ids['realestate']),
+            'name': name, 'market_value': market_value, 'currency': currency,
+            'market_value_usd': market_value * usd_factor.get(currency, 1.0),
+            'address': extra[0] if extra else 'Not specified',
+            'purchase_price': None, 'purchase_date': None, 'property_type': 'residential',
+            'mortgage_loan_ids': [], 'last_updated': stamp})
 
 
 # ---------------------------------------------------------------------------
@@ -1745,6 +2184,7 @@ def _parse_form_lines(portfolio_data, rates, errors):
 @My_Networth_blueprint.route('/My_Networth_html', methods=['GET', 'POST'])
 def calculate_net_worth():
     errors = []
+    dirty = False
 
     # Clear: actually reset the stored data to defaults.
     if request.args.get('clear') == 'true':
@@ -1765,16 +2205,22 @@ def calculate_net_worth():
                 display_currency = new_currency.upper()
             try:
                 _parse_form_lines(portfolio_data, rates, errors)
-                save_portfolio(portfolio_data)
                 if not errors:
+                    save_portfolio(portfolio_data)
                     return redirect(url_for('My_Networth_blueprint.calculate_net_worth',
                                             currency=display_currency))
+                dirty = True
             except Exception as e:
                 errors.append(f"An error occurred: {e}")
 
     # Auto-post any due recurring transactions to real balances (idempotent;
     # each posting is recorded in the ledger). Future occurrences remain a
-    # forecast via build_recurring_summary.
+    # forecast via build_recurring_summary. The ledger is written as soon as
+    # entries are posted, so save the new balances and next_due_dates right
+    # away too: deferring them past the price refresh below would let a
+    # concurrent load (or a failed refresh) post the same occurrences again.
+    # Judge price staleness before that save re-stamps last_updated.
+    prices_stale = needs_refresh(updated_epoch(portfolio_data))
     try:
         if apply_due_transactions(portfolio_data):
             save_portfolio(portfolio_data)
@@ -1782,16 +2228,22 @@ def calculate_net_worth():
         errors.append(f"Error applying recurring transactions: {e}")
 
     # Refresh prices at most once per TTL (guarded, user-initiated navigation).
-    if needs_refresh(portfolio_data.get('last_updated')):
+    if prices_stale:
         stocks = portfolio_data.get('investments', {}).get('stocks', [])
         cryptos = portfolio_data.get('investments', {}).get('cryptos', [])
         errors.extend(update_portfolio_prices(stocks, cryptos, rates))
+        dirty = True
+
+    # A rejected form submission and a price refresh share one write.
+    if dirty:
         save_portfolio(portfolio_data)
 
     payload = build_payload(portfolio_data, display_currency, rates)
     record_snapshot(payload['totals_usd'])
 
-    return render_template(
+    # Stream the page: the ~2k-line template starts reaching the browser
+    # while the holdings tables are still rendering.
+    return stream_template(
         'My_Networth_html.html', errors=errors,
         stocks=payload['stocks'], cryptos=payload['cryptos'], savings=payload['savings'],
         loans=payload['loans'], real_estate=payload['real_estate'], totals=payload['totals'],
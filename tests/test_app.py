@@ -0,0 +1,25 @@
+import unittest
+from unittest import mock
+
+import app as app_module
+from config import Config
+
+
+class DeleteToolTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def test_reports_restart_without_reloader(self):
+        with mock.patch.object(Config, "DEBUG", False), \
+                mock.patch.object(app_module, "remove_function", return_value=True), \
+                mock.patch.object(app_module, "route_file_paths", return_value=()):
+            response = self.client.post("/delete", json={"title": "Demo"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.get_json()["message"], "Tool deleted. Restart the server to unload it."
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()